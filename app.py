@@ -1,12 +1,77 @@
 import streamlit as st
-from dotenv import load_dotenv
+from concurrent.futures import ThreadPoolExecutor
 from typing import Optional, Tuple, List, Dict
 
-from supabase_functions import SupabaseManager
+from supabase_functions import SupabaseManager, load_env
 from gemini_functions import GeminiManager
 
-# Load environment variables
-load_dotenv()
+# Load environment variables; app.py is re-executed on every rerun, so the
+# once-per-process guard lives in an imported module
+load_env()
+
+# Custom CSS for the chat interface, whitespace-collapsed once at import
+# since it is re-sent on every full rerun
+CUSTOM_CSS = " ".join("""
+    <style>
+    .stChat {
+        background-color: #f0f2f6;
+        border-radius: 10px;
+        padding: 10px;
+        margin: 10px 0;
+    }
+    .user-message {
+        background-color: #e3f2fd;
+        padding: 10px;
+        border-radius: 10px;
+        margin: 5px 0;
+    }
+    .assistant-message {
+        background-color: #f0f4c3;
+        padding: 10px;
+        border-radius: 10px;
+        margin: 5px 0;
+    }
+    .conversation-item {
+        padding: 10px;
+        border-radius: 5px;
+        margin: 5px 0;
+        cursor: pointer;
+    }
+    .conversation-item:hover {
+        background-color: #f0f2f6;
+    }
+    .active-conversation {
+        background-color: #e3f2fd;
+    }
+    </style>
+""".split())
+
+# Number of chat messages rendered per window
+CHAT_RENDER_WINDOW = 50
+
+@st.cache_resource
+def get_supabase_manager() -> SupabaseManager:
+    """Get the Supabase manager shared by all sessions."""
+    manager = SupabaseManager()
+    if manager.client is None:
+        # Raise so a failed connection is not cached
+        raise RuntimeError("Supabase client could not be initialized")
+    return manager
+
+@st.cache_resource
+def get_gemini(api_key: str) -> GeminiManager:
+    """Get the Gemini manager shared by all sessions using this API key."""
+    manager = GeminiManager()
+    success, message = manager.configure_api_key(api_key)
+    if not success:
+        # Raise so a failed configuration is not cached
+        raise RuntimeError(message)
+    return manager
+
+@st.cache_resource
+def get_background_executor() -> ThreadPoolExecutor:
+    """Get the thread pool used for database writes off the response path."""
+    return ThreadPoolExecutor(max_workers=4)
 
 def initialize_session_state() -> None:
     """Initialize session state variables."""
@@ -17,11 +82,25 @@ def initialize_session_state() -> None:
     if 'current_conversation_id' not in st.session_state:
         st.session_state.current_conversation_id = None
     if 'supabase_manager' not in st.session_state:
-        st.session_state.supabase_manager = SupabaseManager()
+        try:
+            st.session_state.supabase_manager = get_supabase_manager()
+        except RuntimeError:
+            # Run this session without persistence; the next session retries
+            st.session_state.supabase_manager = SupabaseManager(connect=False)
     if 'conversations' not in st.session_state:
         st.session_state.conversations = []
-    if 'needs_name_update' not in st.session_state:
-        st.session_state.needs_name_update = False
+    if 'conversation_pages' not in st.session_state:
+        st.session_state.conversation_pages = 1
+    if 'has_more_conversations' not in st.session_state:
+        st.session_state.has_more_conversations = False
+    if '_history_dirty' not in st.session_state:
+        st.session_state._history_dirty = False
+    if '_last_saved_len' not in st.session_state:
+        st.session_state._last_saved_len = 0
+    if '_render_offset' not in st.session_state:
+        st.session_state._render_offset = 0
+    if '_pending_conversation' not in st.session_state:
+        st.session_state._pending_conversation = None
 
 def configure_page() -> None:
     """Configure Streamlit page settings."""
@@ -33,44 +112,16 @@ def configure_page() -> None:
 
 def apply_custom_css() -> None:
     """Apply custom CSS for chat interface."""
-    st.markdown("""
-        <style>
-        .stChat {
-            background-color: #f0f2f6;
-            border-radius: 10px;
-            padding: 10px;
-            margin: 10px 0;
-        }
-        .user-message {
-            background-color: #e3f2fd;
-            padding: 10px;
-            border-radius: 10px;
-            margin: 5px 0;
-        }
-        .assistant-message {
-            background-color: #f0f4c3;
-            padding: 10px;
-            border-radius: 10px;
-            margin: 5px 0;
-        }
-        .conversation-item {
-            padding: 10px;
-            border-radius: 5px;
-            margin: 5px 0;
-            cursor: pointer;
-        }
-        .conversation-item:hover {
-            background-color: #f0f2f6;
-        }
-        .active-conversation {
-            background-color: #e3f2fd;
-        }
-        </style>
-    """, unsafe_allow_html=True)
+    st.markdown(CUSTOM_CSS, unsafe_allow_html=True)
 
 def clear_chat_history() -> None:
     """Clear the chat history."""
     st.session_state.chat_history = []
+    # Appends can't shrink the stored history, so overwrite it now
+    save_conversation()
+    st.session_state._last_saved_len = 0
+    st.session_state._history_dirty = False
+    st.session_state._render_offset = 0
 
 def display_chat_message(role: str, content: str) -> None:
     """Display a chat message in the UI."""
@@ -80,8 +131,7 @@ def display_chat_message(role: str, content: str) -> None:
 def add_message_to_history(role: str, content: str) -> None:
     """Add a message to the chat history."""
     st.session_state.chat_history.append({"role": role, "content": content})
-    if st.session_state.current_conversation_id:
-        save_conversation()
+    st.session_state._history_dirty = True
 
 def handle_user_input(prompt: str) -> None:
     """Handle user input and generate response."""
@@ -89,24 +139,24 @@ def handle_user_input(prompt: str) -> None:
         st.error("Please enter your Gemini API key in the sidebar first.")
         return
     
-    # Create new conversation if none exists
-    if st.session_state.current_conversation_id is None:
-        create_new_conversation()
-    
-    # Update conversation name if this is the first message
-    if st.session_state.needs_name_update and prompt:
-        new_name = st.session_state.supabase_manager.generate_conversation_name(prompt)
-        st.session_state.supabase_manager.update_conversation_name(
-            st.session_state.current_conversation_id, 
-            new_name
-        )
-        st.session_state.needs_name_update = False
-        load_conversations()
-    
     # Add user message to history and display
     add_message_to_history("user", prompt)
     display_chat_message("user", prompt)
     
+    # Create the conversation, named from its first message, in a single insert that
+    # already holds the history; run it in the background so the response starts
+    # streaming without waiting on the round trip. The future is kept in session
+    # state so a run interrupted before it is read still adopts the new row
+    db = st.session_state.supabase_manager
+    if st.session_state.current_conversation_id is None and db.client:
+        create_future = get_background_executor().submit(
+            db.create_conversation,
+            db.generate_conversation_name(prompt),
+            list(st.session_state.chat_history),
+            raise_errors=True
+        )
+        st.session_state._pending_conversation = (create_future, len(st.session_state.chat_history))
+    
     # Generate and display assistant response
     with st.chat_message("assistant"):
         response, error = st.session_state.gemini_manager.generate_response(prompt)
@@ -117,24 +167,54 @@ def handle_user_input(prompt: str) -> None:
         else:
             full_response = st.session_state.gemini_manager.display_streaming_response(response)
             add_message_to_history("assistant", full_response)
+    
+    resolve_pending_conversation()
+    
+    # Persist the rest of the turn in a single append
+    flush_chat_history()
 
-def create_new_conversation(first_message: str = None) -> None:
-    """Create a new conversation."""
-    db = st.session_state.supabase_manager
+def resolve_pending_conversation() -> None:
+    """Adopt the conversation created by a background insert, once it finishes."""
+    if st.session_state._pending_conversation is None:
+        return
     
-    # Initially create with a generic name
-    name = db.generate_conversation_name()
+    create_future, saved_len = st.session_state._pending_conversation
+    st.session_state._pending_conversation = None
     
-    result = db.create_conversation(name)
-    if result:
+    # Errors from the worker thread are reported here, on the script thread
+    try:
+        result = create_future.result()
+    except Exception as e:
+        st.error(f"Error creating conversation: {str(e)}")
+        return
+    
+    # Skip if the user has already switched to another conversation
+    if result and st.session_state.current_conversation_id is None:
         st.session_state.current_conversation_id = result['id']
-        st.session_state.chat_history = []
-        st.session_state.needs_name_update = True
-        load_conversations()
+        st.session_state._last_saved_len = saved_len
+
+def create_new_conversation() -> None:
+    """Start a new conversation; it is saved when the first message is sent."""
+    st.session_state.current_conversation_id = None
+    st.session_state.chat_history = []
+    st.session_state._last_saved_len = 0
+    st.session_state._history_dirty = False
+    st.session_state._render_offset = 0
 
 def load_conversations() -> None:
-    """Load all conversations."""
-    st.session_state.conversations = st.session_state.supabase_manager.load_conversations()
+    """Load as many pages of conversations as the user has requested."""
+    db = st.session_state.supabase_manager
+    conversations = []
+    has_more = False
+    
+    for _ in range(st.session_state.conversation_pages):
+        page, has_more = db.load_conversations(conversations[-1] if conversations else None)
+        conversations.extend(page)
+        if not has_more:
+            break
+    
+    st.session_state.conversations = conversations
+    st.session_state.has_more_conversations = has_more
 
 def load_conversation(conversation_id: str) -> None:
     """Load a specific conversation."""
@@ -142,6 +222,9 @@ def load_conversation(conversation_id: str) -> None:
     if result:
         st.session_state.current_conversation_id = conversation_id
         st.session_state.chat_history = result['chat_history']
+        st.session_state._last_saved_len = len(result['chat_history'])
+        st.session_state._history_dirty = False
+        st.session_state._render_offset = 0
 
 def save_conversation() -> None:
     """Save current conversation."""
@@ -151,61 +234,97 @@ def save_conversation() -> None:
             st.session_state.chat_history
         )
 
+def flush_chat_history() -> None:
+    """Append messages added since the last save to the current conversation."""
+    if st.session_state._history_dirty and st.session_state.current_conversation_id:
+        new_messages = st.session_state.chat_history[st.session_state._last_saved_len:]
+        if st.session_state.supabase_manager.append_message(st.session_state.current_conversation_id, new_messages):
+            st.session_state._last_saved_len = len(st.session_state.chat_history)
+            st.session_state._history_dirty = False
+
 def delete_conversation(conversation_id: str) -> None:
     """Delete a conversation."""
     if st.session_state.supabase_manager.delete_conversation(conversation_id):
         if st.session_state.current_conversation_id == conversation_id:
             st.session_state.current_conversation_id = None
             st.session_state.chat_history = []
+            st.session_state._last_saved_len = 0
+            st.session_state._render_offset = 0
         load_conversations()
 
+def on_conversation_picked() -> None:
+    """Load the conversation chosen in the sidebar picker."""
+    conversation_id = st.session_state.conv_picker
+    if conversation_id and conversation_id != st.session_state.current_conversation_id:
+        load_conversation(conversation_id)
+        st.session_state._conversation_switched = True
+
+@st.fragment
 def render_sidebar() -> None:
-    """Render the sidebar with conversations."""
-    with st.sidebar:
-        st.title("💬 Conversations")
-        
-        # New conversation button
-        if st.button("➕ New Conversation", key="new_conversation"):
-            create_new_conversation()
+    """Render the sidebar with conversations.
+    
+    Runs as a fragment inside st.sidebar so its own widgets don't rerun the chat panel.
+    """
+    # Switching conversations changes the chat panel, which is outside this fragment
+    if st.session_state.pop('_conversation_switched', False):
+        st.rerun()
+    
+    st.title("💬 Conversations")
+    
+    # New conversation button
+    if st.button("➕ New Conversation", key="new_conversation"):
+        create_new_conversation()
+        st.rerun()
+    
+    st.markdown("---")
+    
+    # Display conversations with a constant number of widgets
+    names = {conv['id']: conv['name'] for conv in st.session_state.conversations}
+    current_id = st.session_state.current_conversation_id
+    
+    # Keep the picker in sync with the conversation shown in the chat panel
+    st.session_state.conv_picker = current_id if current_id in names else None
+    st.selectbox(
+        "Conversation",
+        options=list(names),
+        format_func=lambda conversation_id: names[conversation_id],
+        index=None,
+        placeholder="Select a conversation",
+        key="conv_picker",
+        on_change=on_conversation_picked
+    )
+    
+    if current_id in names:
+        if st.button("🗑️ Delete current", key="delete_current_conversation", use_container_width=True):
+            delete_conversation(current_id)
             st.rerun()
+    
+    if st.session_state.has_more_conversations:
+        if st.button("Load more", key="load_more_conversations", use_container_width=True):
+            st.session_state.conversation_pages += 1
+            st.rerun()
+    
+    st.markdown("---")
+    
+    # API Key configuration
+    if not st.session_state.gemini_manager.api_key_configured:
+        st.title("⚙️ Configuration")
         
-        st.markdown("---")
-        
-        # Display conversations
-        for conv in st.session_state.conversations:
-            col1, col2 = st.columns([4, 1])
-            
-            with col1:
-                if st.button(conv['name'], key=f"conv_{conv['id']}", use_container_width=True):
-                    load_conversation(conv['id'])
-                    st.rerun()
-            
-            with col2:
-                if st.button("🗑️", key=f"del_{conv['id']}"):
-                    delete_conversation(conv['id'])
-                    st.rerun()
+        st.markdown("""
+        ### Getting Started
+        1. Get your API key from [Google AI Studio](https://makersuite.google.com/app/apikey)
+        2. Enter it below
+        3. Start chatting!
+        """)
         
-        st.markdown("---")
+        api_key = st.text_input("Enter Gemini API Key", type="password", key="api_key_input")
         
-        # API Key configuration
-        if not st.session_state.gemini_manager.api_key_configured:
-            st.title("⚙️ Configuration")
-            
-            st.markdown("""
-            ### Getting Started
-            1. Get your API key from [Google AI Studio](https://makersuite.google.com/app/apikey)
-            2. Enter it below
-            3. Start chatting!
-            """)
-            
-            api_key = st.text_input("Enter Gemini API Key", type="password", key="api_key_input")
-            
-            if api_key:
-                success, message = st.session_state.gemini_manager.configure_api_key(api_key)
-                if success:
-                    st.success(message)
-                else:
-                    st.error(message)
+        if api_key:
+            try:
+                st.session_state.gemini_manager = get_gemini(api_key)
+                st.success("API Key configured successfully!")
+            except RuntimeError as e:
+                st.error(str(e))
 
 def render_chat_interface() -> None:
     """Render the main chat interface."""
@@ -226,27 +345,48 @@ def render_chat_interface() -> None:
     # Add a separator
     st.markdown("---")
     
-    # Display chat history
-    for message in st.session_state.chat_history:
-        display_chat_message(message["role"], message["content"])
+    render_chat_history()
+
+@st.fragment
+def render_chat_history() -> None:
+    """Render the chat messages, as a fragment so revealing older ones skips the rest of the app."""
+    # Display only the tail of the chat history; older messages are revealed on demand
+    visible_count = CHAT_RENDER_WINDOW + st.session_state._render_offset
+    hidden_count = len(st.session_state.chat_history) - visible_count
+    if hidden_count > 0:
+        if st.button(f"Show earlier messages ({hidden_count} hidden)", key="show_earlier_messages"):
+            st.session_state._render_offset += CHAT_RENDER_WINDOW
+            st.rerun(scope="fragment")
     
-    # Chat input
-    if prompt := st.chat_input("Type your message here..."):
-        handle_user_input(prompt)
+    for message in st.session_state.chat_history[-visible_count:]:
+        display_chat_message(message["role"], message["content"])
 
 def main() -> None:
     """Main application function."""
     configure_page()
     apply_custom_css()
     initialize_session_state()
+    # Finish a new-conversation insert left pending by an interrupted run
+    # before anything decides whether to insert again
+    resolve_pending_conversation()
     load_conversations()
     
     # Sidebar with conversations
-    render_sidebar()
+    with st.sidebar:
+        render_sidebar()
     
     # Main chat interface
     render_chat_interface()
     
+    # Chat input stays at the top level so it is pinned to the bottom of the page
+    if prompt := st.chat_input("Type your message here..."):
+        conversation_id = st.session_state.current_conversation_id
+        handle_user_input(prompt)
+        
+        # The sidebar was rendered before this turn; rerun the app if a conversation was created
+        if conversation_id != st.session_state.current_conversation_id:
+            st.rerun()
+    
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,8 +1,28 @@
 # gemini_functions.py
 import google.generativeai as genai
+from google.generativeai import client as genai_client
 import streamlit as st
+import threading
+import time
 from typing import Optional, Tuple
 
+# Minimum seconds between placeholder updates while streaming (~20 Hz)
+STREAM_FLUSH_INTERVAL = 0.05
+
+# genai keeps a single global API key; building models under this lock stops
+# sessions from swapping the key between configure() and binding the client
+_configure_lock = threading.Lock()
+
+def _build_model(api_key: str) -> genai.GenerativeModel:
+    """Build a Gemini model with its client bound to the given API key."""
+    with _configure_lock:
+        genai.configure(api_key=api_key)
+        model = genai.GenerativeModel('gemini-2.0-flash')
+        # The model would otherwise fetch the global client on its first request,
+        # picking up whichever key was configured last
+        model._client = genai_client.get_default_generative_client()
+    return model
+
 class GeminiManager:
     def __init__(self):
         """Initialize Gemini manager."""
@@ -12,8 +32,7 @@ class GeminiManager:
     def configure_api_key(self, api_key: str) -> Tuple[bool, str]:
         """Configure the Gemini API key."""
         try:
-            genai.configure(api_key=api_key)
-            self.model = genai.GenerativeModel('gemini-2.0-flash')
+            self.model = _build_model(api_key)
             self.api_key_configured = True
             return True, "API Key configured successfully!"
         except Exception as e:
@@ -36,17 +55,25 @@ class GeminiManager:
     
     def display_streaming_response(self, response_generator) -> str:
         """Display streaming response with typing indicator."""
-        full_response = ""
+        chunks = []
         message_placeholder = st.empty()
+        last_flush = time.monotonic()
         
         try:
             for chunk in response_generator:
                 if chunk.text:
-                    full_response += chunk.text
-                    message_placeholder.markdown(full_response + "▌")
+                    chunks.append(chunk.text)
+                    # Throttle re-renders; each one resends the whole response
+                    now = time.monotonic()
+                    if now - last_flush > STREAM_FLUSH_INTERVAL or chunk.text.rstrip().endswith(('.', '!', '?')):
+                        message_placeholder.markdown("".join(chunks) + "▌")
+                        last_flush = now
         except Exception as e:
             st.error(f"Error in streaming response: {str(e)}")
+            full_response = "".join(chunks)
+            message_placeholder.markdown(full_response)
             return full_response
         
+        full_response = "".join(chunks)
         message_placeholder.markdown(full_response)
         return full_response
\ No newline at end of file
@@ -0,0 +1,46 @@
+-- Supabase schema additions for the conversations table.
+-- Run these in the Supabase SQL editor.
+
+-- The sidebar lists conversations newest first and pages through them
+-- with (created_at, id) as the keyset cursor.
+DROP INDEX IF EXISTS conversations_created_at_idx;
+CREATE INDEX IF NOT EXISTS conversations_created_at_id_idx
+    ON conversations (created_at DESC, id DESC);
+
+-- Appends new messages to a conversation's chat history in place, so a
+-- turn only sends the new messages instead of the whole history. msg may
+-- be a single message object or an array of messages. Returns whether the
+-- conversation existed, so appends to a deleted conversation are not reported
+-- as saved. The return type changed from void, hence the DROP.
+DROP FUNCTION IF EXISTS append_message(uuid, jsonb);
+CREATE FUNCTION append_message(conv_id uuid, msg jsonb)
+RETURNS boolean
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    UPDATE conversations
+    SET chat_history = COALESCE(chat_history, '[]'::jsonb) || msg
+    WHERE id = conv_id;
+    RETURN FOUND;
+END;
+$$;
+
+-- Timestamps are set by the database rather than sent by the app.
+ALTER TABLE conversations ALTER COLUMN created_at SET DEFAULT now();
+ALTER TABLE conversations ALTER COLUMN updated_at SET DEFAULT now();
+
+CREATE OR REPLACE FUNCTION set_updated_at()
+RETURNS trigger
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    NEW.updated_at = now();
+    RETURN NEW;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS conversations_set_updated_at ON conversations;
+CREATE TRIGGER conversations_set_updated_at
+    BEFORE UPDATE ON conversations
+    FOR EACH ROW
+    EXECUTE FUNCTION set_updated_at();
@@ -1,15 +1,55 @@
 # supabase_functions.py
-from supabase import create_client, Client
-from datetime import datetime
+from supabase import create_client, Client, ClientOptions
+import httpx
+from dotenv import load_dotenv
+from functools import lru_cache
 import streamlit as st
-from typing import Optional, List, Dict, Any
+from typing import Optional, Tuple, List, Dict, Any
 import os
 
+@lru_cache(maxsize=1)
+def load_env() -> bool:
+    """Load environment variables from .env once per process."""
+    load_dotenv()
+    return True
+
+# Bounds and timeouts for the HTTP connection pool shared by all sessions;
+# this client is HTTP/1.1 only, so max_connections caps concurrent requests
+HTTP_POOL_LIMITS = httpx.Limits(max_connections=10, max_keepalive_connections=5, keepalive_expiry=30)
+HTTP_TIMEOUT = httpx.Timeout(30.0, connect=5.0)
+
+# Number of conversations fetched per sidebar page
+CONVERSATIONS_PAGE_SIZE = 50
+
+@st.cache_data(ttl=60, show_spinner=False)
+def _fetch_conversations_cached(_client: Client, before_created_at: Optional[str] = None, before_id: Optional[str] = None) -> List[Dict]:
+    """Fetch a page of conversation list metadata, cached across reruns until a write clears it.
+    
+    Returns up to one row more than a page so callers can tell whether more exist.
+    """
+    query = _client.table('conversations')\
+        .select('id,name,created_at')\
+        .order('created_at', desc=True)\
+        .order('id', desc=True)
+    
+    # Keyset pagination on (created_at, id): continue after the oldest conversation
+    # already loaded, without skipping rows that share its timestamp
+    if before_created_at and before_id:
+        query = query.or_(
+            f'created_at.lt."{before_created_at}",'
+            f'and(created_at.eq."{before_created_at}",id.lt."{before_id}")'
+        )
+    
+    result = query.limit(CONVERSATIONS_PAGE_SIZE + 1).execute()
+    
+    return result.data if result.data else []
+
 class SupabaseManager:
-    def __init__(self):
+    def __init__(self, connect: bool = True):
         """Initialize Supabase client."""
         self.client = None
-        self.initialize_client()
+        if connect:
+            self.initialize_client()
     
     def initialize_client(self) -> None:
         """Initialize Supabase client with credentials."""
@@ -18,48 +58,57 @@ class SupabaseManager:
         
         if supabase_url and supabase_key:
             try:
-                self.client = create_client(supabase_url, supabase_key)
+                http_client = httpx.Client(limits=HTTP_POOL_LIMITS, timeout=HTTP_TIMEOUT)
+                options = ClientOptions(httpx_client=http_client)
+                self.client = create_client(supabase_url, supabase_key, options=options)
             except Exception as e:
                 st.error(f"Error initializing Supabase: {str(e)}")
         else:
             st.warning("Supabase credentials not found. Please set SUPABASE_URL and SUPABASE_KEY in your .env file.")
     
-    def create_conversation(self, name: str, chat_history: List[Dict] = None) -> Optional[Dict]:
-        """Create a new conversation in Supabase."""
+    def create_conversation(self, name: str, chat_history: List[Dict] = None, raise_errors: bool = False) -> Optional[Dict]:
+        """Create a new conversation in Supabase.
+        
+        Pass raise_errors=True when calling off the script thread, where st.error can't display.
+        """
         if not self.client:
             return None
         
         try:
             data = {
                 'name': name,
-                'chat_history': chat_history or [],
-                'created_at': datetime.now().isoformat()
+                'chat_history': chat_history or []
             }
             
             result = self.client.table('conversations').insert(data).execute()
+            _fetch_conversations_cached.clear()
             
             if result.data:
                 return result.data[0]
             return None
         except Exception as e:
+            if raise_errors:
+                raise
             st.error(f"Error creating conversation: {str(e)}")
             return None
     
-    def load_conversations(self) -> List[Dict]:
-        """Load all conversations from Supabase."""
+    def load_conversations(self, before: Optional[Dict] = None) -> Tuple[List[Dict], bool]:
+        """Load a page of conversation ids and names older than the given conversation.
+        
+        Returns the page and whether more conversations follow it.
+        """
         if not self.client:
-            return []
+            return [], False
         
         try:
-            result = self.client.table('conversations')\
-                .select('*')\
-                .order('created_at', desc=True)\
-                .execute()
-            
-            return result.data if result.data else []
+            if before:
+                rows = _fetch_conversations_cached(self.client, before['created_at'], before['id'])
+            else:
+                rows = _fetch_conversations_cached(self.client)
+            return rows[:CONVERSATIONS_PAGE_SIZE], len(rows) > CONVERSATIONS_PAGE_SIZE
         except Exception as e:
             st.error(f"Error loading conversations: {str(e)}")
-            return []
+            return [], False
     
     def load_conversation(self, conversation_id: str) -> Optional[Dict]:
         """Load a specific conversation from Supabase."""
@@ -70,11 +119,12 @@ class SupabaseManager:
             result = self.client.table('conversations')\
                 .select('*')\
                 .eq('id', conversation_id)\
+                .limit(1)\
+                .maybe_single()\
                 .execute()
             
-            if result.data:
-                return result.data[0]
-            return None
+            # maybe_single() yields no response at all when the row is missing
+            return result.data if result else None
         except Exception as e:
             st.error(f"Error loading conversation: {str(e)}")
             return None
@@ -86,8 +136,7 @@ class SupabaseManager:
         
         try:
             data = {
-                'chat_history': chat_history,
-                'updated_at': datetime.now().isoformat()
+                'chat_history': chat_history
             }
             
             result = self.client.table('conversations')\
@@ -100,6 +149,23 @@ class SupabaseManager:
             st.error(f"Error updating conversation: {str(e)}")
             return False
     
+    def append_message(self, conversation_id: str, messages: List[Dict]) -> bool:
+        """Append messages to a conversation's chat history server-side."""
+        if not self.client:
+            return False
+        
+        try:
+            result = self.client.rpc('append_message', {
+                'conv_id': conversation_id,
+                'msg': messages
+            }).execute()
+            
+            # The function returns false when the conversation no longer exists
+            return bool(result.data)
+        except Exception as e:
+            st.error(f"Error appending to conversation: {str(e)}")
+            return False
+    
     def delete_conversation(self, conversation_id: str) -> bool:
         """Delete a conversation from Supabase."""
         if not self.client:
@@ -110,21 +176,16 @@ class SupabaseManager:
                 .delete()\
                 .eq('id', conversation_id)\
                 .execute()
+            _fetch_conversations_cached.clear()
             
             return True
         except Exception as e:
             st.error(f"Error deleting conversation: {str(e)}")
             return False
     
-    def generate_conversation_name(self, first_message: str = None) -> str:
-        """Generate a name for the conversation."""
-        if first_message:
-            return first_message[:30] + "..." if len(first_message) > 30 else first_message
-        else:
-            # Count existing conversations to generate a number
-            conversations = self.load_conversations()
-            count = len(conversations) + 1
-            return f"New Chat {count}"
+    def generate_conversation_name(self, first_message: str) -> str:
+        """Generate a name for the conversation from its first message."""
+        return first_message[:30] + "..." if len(first_message) > 30 else first_message
     
     def update_conversation_name(self, conversation_id: str, new_name: str) -> bool:
         """Update the name of a conversation."""
@@ -133,14 +194,14 @@ class SupabaseManager:
         
         try:
             data = {
-                'name': new_name,
-                'updated_at': datetime.now().isoformat()
+                'name': new_name
             }
             
             result = self.client.table('conversations')\
                 .update(data)\
                 .eq('id', conversation_id)\
                 .execute()
+            _fetch_conversations_cached.clear()
             
             return bool(result.data)
         except Exception as e: